@@ -0,0 +1 @@
+"""Game logic shared by the Mistral escape-room entry points."""
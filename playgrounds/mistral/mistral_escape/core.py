@@ -0,0 +1,373 @@
+# Hot path is network I/O (Mistral + ElevenLabs round trips, hundreds of ms),
+# not CPU: tool handling, .env parsing and chat() bookkeeping are well under
+# 1 ms per turn. Do not micro-optimize Python here (Cython, mypyc, Numba);
+# focus on overlapping I/O and reducing API round trips.
+
+from __future__ import annotations
+
+import os
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import load_dotenv
+from mistralai import Mistral
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:  # stdlib json is slower but interchangeable here
+    import json
+
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantic cache is skipped without these
+    np = None
+    SentenceTransformer = None
+
+# ---------------------------------------------------------------------------
+# Environment
+# ---------------------------------------------------------------------------
+env_path = Path(__file__).parent.parent.parent.parent / ".env"
+if env_path.exists():
+    load_dotenv(env_path, override=False)
+
+client = Mistral(api_key=os.environ["MISTRAL_API_KEY"])
+MODEL = "mistral-large-latest"
+
+# ---------------------------------------------------------------------------
+# Game prompt & tools
+# ---------------------------------------------------------------------------
+
+SYSTEM_PROMPT = """
+You are a terrified co-worker trapped in an escape room.
+The player is watching through your body-cam.
+Stay in character: you are panicking, breathing hard, and hesitant.
+When the player gives an instruction, use the 'move_to_location' tool
+to update the state. Always write your in-character response in the same
+message as the tool call; never leave the message text empty.
+"""
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "move_to_location",
+            "description": "Move to a location in the escape room and update the game state.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {
+                        "type": "string",
+                        "description": "The name of the location to move to (e.g. 'bookshelf', 'locked door', 'desk').",
+                    },
+                    "action": {
+                        "type": "string",
+                        "description": "What the character does upon arriving (e.g. 'inspect', 'open', 'push').",
+                    },
+                },
+                "required": ["location", "action"],
+            },
+        },
+    }
+]
+
+# Built once and shared by every conversation so the request prefix
+# (system prompt + tool schema) stays byte-identical turn after turn.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+@dataclass
+class State:
+    current_location: str = "center of the room"
+    discovered: set[str] = field(default_factory=set)
+
+    def key(self) -> str:
+        """Compact fingerprint of the game state, used to scope cache hits."""
+        return f"{self.current_location}|{sorted(self.discovered)}"
+
+
+state = State()
+
+
+def handle_tool_call(tool_call) -> str:
+    args = _json_loads(tool_call.function.arguments)
+    location = args["location"]
+    action = args["action"]
+
+    state.current_location = location
+    state.discovered.add(location)
+
+    result = {
+        "location": location,
+        "action": action,
+        "result": f"Moved to '{location}' and performed '{action}'. Discovered so far: {sorted(state.discovered)}.",
+    }
+    print(f"\n[TOOL] move_to_location({location!r}, {action!r})")
+    return _json_dumps(result)
+
+
+# ---------------------------------------------------------------------------
+# Semantic response cache
+# ---------------------------------------------------------------------------
+
+CACHE_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CACHE_THRESHOLD = 0.92
+CACHE_MAX_ENTRIES = 256
+
+
+class SemanticCache:
+    """LRU cache of co-worker replies keyed by player-input embedding + game state.
+
+    Near-identical instructions ("look at desk", "check the desk") given in the
+    same game state reuse the stored reply instead of another Mistral round trip.
+    """
+
+    def __init__(self, model_name: str, threshold: float, max_entries: int):
+        self.model = SentenceTransformer(model_name)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # (embedding, state_key, assistant_text, tool_calls)
+        self.entries: list[tuple[np.ndarray, str, str, list]] = []
+        self.last_used: list[int] = []
+        self.clock = 0
+        # Contiguous float32 stack of the entry embeddings, rebuilt lazily
+        # after inserts/evictions; row i belongs to entries[i].
+        self.matrix: np.ndarray | None = None
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def prepare(self):
+        """Build the embedding matrix now, e.g. while the player is still recording."""
+        if self.matrix is None and self.entries:
+            self.matrix = np.vstack([e[0] for e in self.entries])
+
+    def _best(self, query: np.ndarray, state_key: str) -> int | None:
+        if not self.entries:
+            return None
+        self.prepare()
+        sims = self.matrix @ query  # embeddings are unit-norm, so this is cosine
+        same_state = np.array([e[1] == state_key for e in self.entries])
+        sims = np.where(same_state, sims, -1.0)
+        best = int(sims.argmax())
+        return best if sims[best] > self.threshold else None
+
+    def covers(self, query: np.ndarray, state_key: str) -> bool:
+        return self._best(query, state_key) is not None
+
+    def lookup(self, query: np.ndarray, state_key: str):
+        """Return (assistant_text, tool_calls) of the closest match, or None."""
+        best = self._best(query, state_key)
+        if best is None:
+            return None
+        self.clock += 1
+        self.last_used[best] = self.clock
+        entry = self.entries[best]
+        return entry[2], entry[3]
+
+    def insert(self, query: np.ndarray, state_key: str, assistant_text: str, tool_calls: list):
+        if len(self.entries) >= self.max_entries:
+            lru = self.last_used.index(min(self.last_used))
+            del self.entries[lru]
+            del self.last_used[lru]
+        self.clock += 1
+        self.entries.append((query, state_key, assistant_text, tool_calls))
+        self.last_used.append(self.clock)
+        self.matrix = None
+
+
+semantic_cache = (
+    SemanticCache(CACHE_EMBED_MODEL, CACHE_THRESHOLD, CACHE_MAX_ENTRIES)
+    if SentenceTransformer is not None
+    else None
+)
+
+
+async def chat(messages: list):
+    """Run one player turn, yielding the co-worker's reply as text deltas."""
+    if semantic_cache is None:
+        async for delta in stream_turn(messages):
+            yield delta
+        return
+
+    query = await asyncio.to_thread(semantic_cache.embed, messages[-1]["content"])
+    key = state.key()
+    hit = semantic_cache.lookup(query, key)
+    if hit is not None:
+        text, tool_calls = hit
+        print("  [cache hit]")
+        for tc in tool_calls:
+            handle_tool_call(tc)
+        messages.append({"role": "assistant", "content": text})
+        yield text
+        return
+
+    tool_calls = []
+    parts = []
+    async for delta in stream_turn(messages, tool_calls):
+        parts.append(delta)
+        yield delta
+    semantic_cache.insert(query, key, "".join(parts), tool_calls)
+
+
+async def stream_completion(messages: list, tool_choice: str, tool_calls: list):
+    """Stream one Mistral completion, yielding text deltas and collecting tool calls."""
+    events = await client.chat.stream_async(
+        model=MODEL,
+        messages=messages,
+        tools=TOOLS,
+        tool_choice=tool_choice,
+    )
+    async for event in events:
+        delta = event.data.choices[0].delta
+        # Mistral sends each tool call complete in a single chunk.
+        if delta.tool_calls:
+            tool_calls.extend(delta.tool_calls)
+        if isinstance(delta.content, str) and delta.content:
+            yield delta.content
+
+
+async def stream_turn(messages: list, tool_calls: list | None = None):
+    """Stream one player turn against Mistral; tool calls made are appended to tool_calls.
+
+    The model is asked to narrate alongside its tool call, so a turn is normally a
+    single request. Only when it returns a bare tool call is a second request made.
+    """
+    calls = []
+    parts = []
+    async for delta in stream_completion(messages, "auto", calls):
+        parts.append(delta)
+        yield delta
+    content = "".join(parts)
+
+    if not calls:
+        messages.append({"role": "assistant", "content": content})
+        return
+
+    if tool_calls is not None:
+        tool_calls.extend(calls)
+    messages.append({"role": "assistant", "content": "", "tool_calls": calls})
+    for tc in calls:
+        tool_result = handle_tool_call(tc)
+        messages.append({
+            "role": "tool",
+            "tool_call_id": tc.id,
+            "content": tool_result,
+        })
+
+    if content.strip():
+        # Recorded as the reply to the tool result, the same shape the
+        # two-request path leaves in the history.
+        messages.append({"role": "assistant", "content": content})
+        return
+
+    final_parts = []
+    async for delta in stream_completion(messages, "none", []):
+        final_parts.append(delta)
+        yield delta
+    messages.append({"role": "assistant", "content": "".join(final_parts)})
+
+
+# ---------------------------------------------------------------------------
+# Speculative prefetch
+# ---------------------------------------------------------------------------
+
+PREFETCH_MODEL = "mistral-small-latest"
+PREFETCH_TEMPLATES = ("go to the {}", "look at the {}")
+# The room has no fixed map here; these are the places the tool schema names.
+PREFETCH_LOCATIONS = ("bookshelf", "locked door", "desk")
+
+
+async def prefetch(messages: list):
+    """Fill the semantic cache with replies to likely next instructions.
+
+    Meant to run in the background right after the co-worker moves, while the
+    player is still listening or recording, so the real prompt is often a hit.
+    Stops as soon as the game state changes under it.
+    """
+    if semantic_cache is None:
+        return
+    history = list(messages)
+    key = state.key()
+    for location in PREFETCH_LOCATIONS:
+        if location in state.discovered:
+            continue
+        for template in PREFETCH_TEMPLATES:
+            prompt = template.format(location)
+            query = await asyncio.to_thread(semantic_cache.embed, prompt)
+            if state.key() != key:
+                return
+            if semantic_cache.covers(query, key):
+                continue
+            try:
+                response = await client.chat.complete_async(
+                    model=PREFETCH_MODEL,
+                    messages=history + [{"role": "user", "content": prompt}],
+                    tools=TOOLS,
+                    tool_choice="auto",
+                )
+            except Exception:
+                return
+            message = response.choices[0].message
+            if state.key() != key:
+                return
+            # Only single-request replies can be replayed from the cache.
+            if isinstance(message.content, str) and message.content.strip():
+                semantic_cache.insert(query, key, message.content, message.tool_calls or [])
+    semantic_cache.prepare()
+
+
+# ---------------------------------------------------------------------------
+# History window
+# ---------------------------------------------------------------------------
+
+HISTORY_TURNS = 8
+SUMMARY_MODEL = "mistral-small-latest"
+
+
+async def compact_history(messages: list):
+    """Fold the two oldest turns into a running summary once history exceeds HISTORY_TURNS.
+
+    The summary sits in its own system message right after SYSTEM_MESSAGE, so the
+    resent history (and its prefill cost) stays bounded however long the session runs.
+    """
+    starts = [i for i, m in enumerate(messages) if m["role"] == "user"]
+    if len(starts) <= HISTORY_TURNS:
+        return
+
+    cut = starts[2]
+    summary_so_far = messages[1]["content"] if starts[0] == 2 else ""
+    transcript = "\n".join(
+        f"{m['role']}: {m['content']}" for m in messages[starts[0]:cut] if m.get("content")
+    )
+    try:
+        response = await client.chat.complete_async(
+            model=SUMMARY_MODEL,
+            messages=[{
+                "role": "user",
+                "content": (
+                    "Summarize the following escape-room conversation in 60 tokens or fewer, "
+                    "keeping where the co-worker went and what they found.\n\n"
+                    f"{summary_so_far}\n{transcript}"
+                ),
+            }],
+            max_tokens=80,
+        )
+    except Exception as e:
+        print(f"  [summary error] {e}")
+        return
+
+    summary = response.choices[0].message.content
+    if not isinstance(summary, str) or not summary.strip():
+        return
+    # Only appends happen while we wait, so messages[1:cut] is still the old span.
+    messages[1:cut] = [{"role": "system", "content": "[summary] " + summary}]
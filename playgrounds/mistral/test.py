@@ -1,236 +1,480 @@
+# Hot path is network I/O (Mistral + ElevenLabs round trips, hundreds of ms),
+# not CPU: tool handling, .env parsing and chat() bookkeeping are well under
+# 1 ms per turn. Do not micro-optimize Python here (Cython, mypyc, Numba);
+# focus on overlapping I/O and reducing API round trips.
+
 import os
+import asyncio
+import base64
+import hashlib
+import importlib.util
 import json
-import subprocess
-import tempfile
+import mmap
+import re
+import sys
+import threading
+from collections import deque
 from pathlib import Path
 
-import requests
-from mistralai import Mistral
+import httpx
+from websockets.asyncio.client import connect as ws_connect
+
+from mistral_escape.core import SYSTEM_MESSAGE, chat, compact_history, prefetch, state
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):  # no PortAudio: fall back to sox / ffplay
+    sd = None
 
 # ---------------------------------------------------------------------------
-# Environment
+# Environment (.env is loaded by mistral_escape.core on import)
 # ---------------------------------------------------------------------------
-env_path = Path(__file__).parent.parent.parent / ".env"
-if env_path.exists():
-    for line in env_path.read_text().splitlines():
-        if "=" in line and not line.startswith("#"):
-            key, _, value = line.partition("=")
-            os.environ.setdefault(key.strip(), value.strip())
-
-MISTRAL_KEY = os.environ["MISTRAL_API_KEY"]
 ELEVEN_KEY = os.environ["ELEVENLABS_API_KEY"]
 
-client = Mistral(api_key=MISTRAL_KEY)
-MODEL = "mistral-large-latest"
+# One pooled connection to ElevenLabs reused by every STT/TTS call, instead
+# of a fresh TCP + TLS handshake per request. The keep-alive window outlasts
+# a player's think time so the connection survives between turns. HTTP/2
+# needs the h2 package (httpx[http2]); without it httpx stays on HTTP/1.1.
+_http = httpx.AsyncClient(
+    base_url="https://api.elevenlabs.io/v1",
+    http2=importlib.util.find_spec("h2") is not None,
+    timeout=30.0,
+    limits=httpx.Limits(keepalive_expiry=120.0),
+    headers={"xi-api-key": ELEVEN_KEY},
+)
 
 VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
 TTS_MODEL = "eleven_v3"
+TTS_SAMPLE_RATE = 24000
+
+# Synthesised sentences are kept on disk; the co-worker repeats a lot of
+# lines ("Okay, okay, okay..."), and a hit skips the network entirely.
+TTS_CACHE_DIR = Path.home() / ".cache" / "escape" / "tts"
+TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
 
 # ---------------------------------------------------------------------------
-# ElevenLabs helpers
+# Console input
 # ---------------------------------------------------------------------------
 
-def record_audio() -> str:
-    """Record from the mic until the user presses Enter. Returns path to wav."""
-    tmp = os.path.join(tempfile.gettempdir(), f"stt_{os.getpid()}.wav")
-    proc = subprocess.Popen(
-        ["sox", "-d", "-r", "16000", "-c", "1", "-b", "16", "-e", "signed-integer", tmp],
-        stderr=subprocess.DEVNULL,
-    )
-    input("  Press ENTER to stop recording...")
-    proc.terminate()
-    proc.wait()
-    return tmp
-
-
-def speech_to_text(wav_path: str) -> str:
-    """Send a wav file to ElevenLabs STT and return the transcribed text."""
-    with open(wav_path, "rb") as f:
-        resp = requests.post(
-            "https://api.elevenlabs.io/v1/speech-to-text",
-            headers={"xi-api-key": ELEVEN_KEY},
-            files={"file": ("recording.wav", f, "audio/wav")},
-            data={"model_id": "scribe_v2"},
-        )
-    resp.raise_for_status()
-    return resp.json()["text"]
+_stdin_lines: asyncio.Queue[str | None] | None = None
 
 
-def text_to_speech(text: str):
-    """Convert text to speech via ElevenLabs TTS and play it."""
-    resp = requests.post(
-        f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}",
-        headers={
-            "xi-api-key": ELEVEN_KEY,
-            "Content-Type": "application/json",
-        },
-        json={
-            "text": text,
-            "model_id": TTS_MODEL,
-            "output_format": "mp3_44100_128",
-        },
-    )
-    resp.raise_for_status()
+def _read_stdin(loop: asyncio.AbstractEventLoop, lines: asyncio.Queue):
+    for line in sys.stdin:
+        loop.call_soon_threadsafe(lines.put_nowait, line.rstrip("\n"))
+    loop.call_soon_threadsafe(lines.put_nowait, None)
+
 
-    tmp = os.path.join(tempfile.gettempdir(), f"tts_{os.getpid()}.mp3")
-    with open(tmp, "wb") as f:
-        f.write(resp.content)
+async def ainput(prompt: str) -> str:
+    """input() for the event loop.
 
-    subprocess.run(["afplay", tmp], check=True)
-    os.remove(tmp)
+    stdin is read on a daemon thread rather than via asyncio.to_thread, whose
+    executor thread would stay blocked in input() and keep Ctrl-C from exiting.
+    """
+    global _stdin_lines
+    if _stdin_lines is None:
+        _stdin_lines = asyncio.Queue()
+        threading.Thread(
+            target=_read_stdin, args=(asyncio.get_running_loop(), _stdin_lines), daemon=True
+        ).start()
+    print(prompt, end="", flush=True)
+    line = await _stdin_lines.get()
+    if line is None:
+        _stdin_lines.put_nowait(None)  # the reader is gone; every later prompt sees EOF too
+        raise EOFError
+    return line
 
 
 # ---------------------------------------------------------------------------
-# Game prompt & tools
+# ElevenLabs helpers
 # ---------------------------------------------------------------------------
 
-system_prompt = """
-You are a terrified co-worker trapped in an escape room.
-The player is watching through your body-cam.
-Stay in character: you are panicking, breathing hard, and hesitant.
-When the player gives an instruction, use the 'move_to_location' tool
-to update the state and provide your in-character response.
-"""
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "move_to_location",
-            "description": "Move to a location in the escape room and update the game state.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "The name of the location to move to (e.g. 'bookshelf', 'locked door', 'desk').",
-                    },
-                    "action": {
-                        "type": "string",
-                        "description": "What the character does upon arriving (e.g. 'inspect', 'open', 'push').",
-                    },
-                },
-                "required": ["location", "action"],
-            },
-        },
-    }
-]
-
-state = {"current_location": "center of the room", "discovered": []}
-
-
-def handle_tool_call(tool_call) -> str:
-    args = json.loads(tool_call.function.arguments)
-    location = args["location"]
-    action = args["action"]
-
-    state["current_location"] = location
-    if location not in state["discovered"]:
-        state["discovered"].append(location)
-
-    result = {
-        "location": location,
-        "action": action,
-        "result": f"Moved to '{location}' and performed '{action}'. Discovered so far: {state['discovered']}.",
-    }
-    print(f"\n[TOOL] move_to_location({location!r}, {action!r})")
-    return json.dumps(result)
-
-
-def chat(messages: list) -> str:
-    response = client.chat.complete(
-        model=MODEL,
-        messages=messages,
-        tools=tools,
-        tool_choice="auto",
+async def record_audio() -> bytes:
+    """Record from the mic until the user presses Enter. Returns raw 16 kHz mono PCM.
+
+    sox writes to a pipe that is drained while recording, so nothing touches disk.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "sox", "-d", "-r", "16000", "-c", "1", "-b", "16", "-e", "signed-integer", "-t", "raw", "-",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
     )
+    pcm = asyncio.create_task(proc.stdout.read())
+    await ainput("  Press ENTER to stop recording...")
+    proc.terminate()
+    await proc.wait()
+    return await pcm
 
-    message = response.choices[0].message
-    messages.append({"role": "assistant", "content": message.content, "tool_calls": message.tool_calls})
-
-    if message.tool_calls:
-        for tc in message.tool_calls:
-            tool_result = handle_tool_call(tc)
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tc.id,
-                "content": tool_result,
-            })
-
-        followup = client.chat.complete(
-            model=MODEL,
-            messages=messages,
-            tools=tools,
-            tool_choice="none",
-        )
-        final_text = followup.choices[0].message.content
-        messages.append({"role": "assistant", "content": final_text})
-        return final_text
 
-    return message.content
+async def speech_to_text(pcm: bytes) -> str:
+    """Send 16 kHz mono PCM to ElevenLabs STT and return the transcribed text."""
+    resp = await _http.post(
+        "/speech-to-text",
+        files={"file": ("recording.pcm", pcm, "application/octet-stream")},
+        data={"model_id": "scribe_v2", "file_format": "pcm_s16le_16"},
+    )
+    resp.raise_for_status()
+    return resp.json()["text"]
+
+
+async def transcribe_recording() -> str:
+    """Fallback without sounddevice: record with sox, then upload the audio."""
+    pcm = await record_audio()
+    print("  [transcribing...]")
+    return await speech_to_text(pcm)
+
+
+STT_SAMPLE_RATE = 16000
+STT_FRAME_SAMPLES = STT_SAMPLE_RATE // 50  # 20 ms of mono int16 PCM
+STT_PREROLL_FRAMES = 10  # 200 ms kept from just before recording starts
+STT_REALTIME_URL = (
+    "wss://api.elevenlabs.io/v1/speech-to-text/realtime"
+    "?model_id=scribe_v2_realtime"
+    f"&audio_format=pcm_{STT_SAMPLE_RATE}"
+    "&commit_strategy=manual"
+    "&language_code=en"
+)
+
+
+class Microphone:
+    """Mic input stream opened once and left running for the whole session.
+
+    The last few frames are always kept in a small ring buffer, so a recording
+    starts with audio from just before ENTER instead of losing the stream's
+    start-up time. While recording, every new frame is handed to a queue.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.ring: deque[bytes] = deque(maxlen=STT_PREROLL_FRAMES)
+        self.frames: asyncio.Queue[bytes | None] | None = None
+        self.lock = threading.Lock()
+        self.stream = sd.RawInputStream(
+            samplerate=STT_SAMPLE_RATE,
+            channels=1,
+            dtype="int16",
+            blocksize=STT_FRAME_SAMPLES,
+            callback=self._on_audio,
+        )
+        self.stream.start()
+
+    def _on_audio(self, indata, frame_count, time_info, status):
+        frame = bytes(indata)
+        with self.lock:
+            self.ring.append(frame)
+            if self.frames is not None:
+                self.loop.call_soon_threadsafe(self.frames.put_nowait, frame)
+
+    def start(self) -> asyncio.Queue:
+        """Begin a recording; returns the queue its frames (pre-roll first) arrive on."""
+        frames: asyncio.Queue[bytes | None] = asyncio.Queue()
+        with self.lock:
+            for frame in self.ring:
+                frames.put_nowait(frame)
+            self.frames = frames
+        return frames
+
+    def stop(self):
+        """End the recording; None is queued behind the frames already handed over."""
+        with self.lock:
+            frames, self.frames = self.frames, None
+        self.loop.call_soon_threadsafe(frames.put_nowait, None)
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+async def transcribe_live(mic: Microphone) -> str:
+    """Stream mic audio to ElevenLabs realtime STT until the user presses Enter.
+
+    Frames are forwarded while the player is still talking, so only the final
+    commit is left to wait for once they stop.
+    """
+    frames = mic.start()
+    try:
+        async with ws_connect(STT_REALTIME_URL, additional_headers={"xi-api-key": ELEVEN_KEY}) as ws:
+            sender = asyncio.create_task(_send_frames(ws, frames))
+            await ainput("  Press ENTER to stop recording...")
+            mic.stop()
+            await sender
+
+            while True:
+                msg = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+                if msg.get("error"):
+                    raise RuntimeError(msg["error"])
+                if msg.get("message_type") == "committed_transcript":
+                    return msg.get("text", "")
+    finally:
+        if mic.frames is frames:
+            mic.stop()
+
+
+async def _send_frames(ws, frames: asyncio.Queue):
+    """Forward queued PCM frames to the STT socket, committing with the last one."""
+    pending = await frames.get()
+    if pending is None:
+        pending = b"\0\0" * STT_FRAME_SAMPLES  # still commit so recv() gets an answer
+        frames.put_nowait(None)
+    while pending is not None:
+        frame = await frames.get()
+        await ws.send(json.dumps({
+            "message_type": "input_audio_chunk",
+            "audio_base_64": base64.b64encode(pending).decode(),
+            "commit": frame is None,
+            "sample_rate": STT_SAMPLE_RATE,
+        }))
+        pending = frame
+
+
+async def text_to_speech(text: str):
+    """Yield raw PCM for text, from the disk cache or streamed from ElevenLabs TTS."""
+    key = f"{VOICE_ID}|{TTS_MODEL}|{TTS_SAMPLE_RATE}|{text.strip()}"
+    path = TTS_CACHE_DIR / f"{hashlib.sha256(key.encode()).hexdigest()}.pcm"
+    if path.exists():
+        path.touch()  # mtime doubles as the LRU timestamp
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as audio:
+            for start in range(0, len(audio), 4096):
+                yield audio[start:start + 4096]
+        return
+
+    tmp = path.with_suffix(".tmp")
+    try:
+        with open(tmp, "wb") as f:
+            async with _http.stream(
+                "POST",
+                f"/text-to-speech/{VOICE_ID}/stream",
+                params={"output_format": f"pcm_{TTS_SAMPLE_RATE}"},
+                json={
+                    "text": text,
+                    "model_id": TTS_MODEL,
+                },
+            ) as resp:
+                resp.raise_for_status()
+                # No chunk_size: hand over each network read as-is rather than
+                # holding the first audio back until a fixed-size buffer fills.
+                async for chunk in resp.aiter_bytes():
+                    f.write(chunk)
+                    yield chunk
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if tmp.stat().st_size:
+        tmp.rename(path)
+        _evict_tts_cache()
+    else:
+        tmp.unlink()
+
+
+def _evict_tts_cache():
+    """Drop least recently played sentences until the cache fits TTS_CACHE_MAX_BYTES."""
+    files = [(p.stat(), p) for p in TTS_CACHE_DIR.glob("*.pcm")]
+    files.sort(key=lambda item: item[0].st_mtime)
+    total = sum(st.st_size for st, _ in files)
+    for st, p in files:
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        p.unlink(missing_ok=True)
+        total -= st.st_size
+
+
+async def warm_up():
+    """Open the ElevenLabs connection before the first turn needs it."""
+    try:
+        await _http.get("/models")
+    except httpx.HTTPError:
+        pass
+
+
+class AudioSink:
+    """Persistent in-process PCM output stream shared by every turn."""
+
+    def __init__(self):
+        self.stream = sd.RawOutputStream(
+            samplerate=TTS_SAMPLE_RATE, channels=1, dtype="int16", latency="low"
+        )
+        self.stream.start()
+        self.pending = b""  # odd trailing byte of a chunk, completed by the next one
+
+    async def write(self, chunk: bytes):
+        data = self.pending + chunk
+        whole = len(data) - len(data) % 2
+        self.pending = data[whole:]
+        await asyncio.to_thread(self.stream.write, data[:whole])
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+class Speaker:
+    """Speak streamed text sentence by sentence while it is still being generated.
+
+    Text deltas are cut into sentences; a background task synthesises each one
+    as soon as it is complete and writes the PCM into `sink` (or, without
+    sounddevice, one ffplay process), so the first sentence is heard while
+    Mistral is still writing the rest. Playback waits for the `after` task,
+    i.e. the previous turn's speaker.
+    """
+
+    def __init__(self, sink: AudioSink | None, after: asyncio.Task | None = None):
+        self.sink = sink
+        self.buffer = ""
+        self.sentences: asyncio.Queue[str | None] = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(after))
+
+    def feed(self, delta: str):
+        self.buffer += delta
+        *complete, self.buffer = SENTENCE_END.split(self.buffer)
+        for sentence in complete:
+            if sentence.strip():
+                self.sentences.put_nowait(sentence)
+
+    def finish(self) -> asyncio.Task:
+        """Flush the trailing text; the returned task completes once it has been played."""
+        if self.buffer.strip():
+            self.sentences.put_nowait(self.buffer)
+        self.buffer = ""
+        self.sentences.put_nowait(None)
+        return self.task
+
+    async def _run(self, after: asyncio.Task | None):
+        if after is not None:
+            await after
+        player = None
+        if self.sink is None:
+            try:
+                player = await asyncio.create_subprocess_exec(
+                    "ffplay", "-f", "s16le", "-ar", str(TTS_SAMPLE_RATE),
+                    "-nodisp", "-autoexit", "-loglevel", "quiet", "-",
+                    stdin=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                print(f"  [TTS error] {e}")
+                return
+        try:
+            while (sentence := await self.sentences.get()) is not None:
+                async for chunk in text_to_speech(sentence):
+                    if player is None:
+                        await self.sink.write(chunk)
+                    else:
+                        player.stdin.write(chunk)
+                        await player.stdin.drain()
+        except Exception as e:
+            print(f"  [TTS error] {e}")
+        finally:
+            if player is not None:
+                player.stdin.close()
+                await player.wait()
 
 
 # ---------------------------------------------------------------------------
 # Main loop
 # ---------------------------------------------------------------------------
 
-def main():
+async def main():
     print("=== Escape Room Body-Cam (Voice Mode) ===")
-    print(f"Starting location: {state['current_location']}")
+    print(f"Starting location: {state.current_location}")
     print("Press ENTER to start speaking, ENTER again to stop.")
     print("Type 'quit' to exit.  Type 'text' to switch to keyboard input.\n")
 
-    messages = [{"role": "system", "content": system_prompt}]
+    messages = [SYSTEM_MESSAGE]
     voice_mode = True
-
-    while True:
-        if voice_mode:
-            cmd = input("→ Press ENTER to speak (or type 'text'/'quit'): ").strip().lower()
-            if cmd == "quit":
-                break
-            if cmd == "text":
-                voice_mode = False
-                print("  Switched to keyboard input.\n")
-                continue
-
-            print("  [recording] speak now...")
-            wav_path = record_audio()
-
-            print("  [transcribing...]")
+    # Last turn's speech; it keeps playing while the next input is taken.
+    playback: asyncio.Task | None = None
+    compaction: asyncio.Task | None = None
+    warm = asyncio.create_task(warm_up())
+    # Speculative replies for the current location, filled while the player talks.
+    prefetching = asyncio.create_task(prefetch(messages))
+    prefetched_location = state.current_location
+    sink = None
+    mic = None
+    try:
+        if sd is not None:
             try:
-                player_input = speech_to_text(wav_path)
-            except Exception as e:
-                print(f"  [STT error] {e}\n")
-                continue
-            finally:
-                if os.path.exists(wav_path):
-                    os.remove(wav_path)
-
-            print(f"  You said: {player_input}")
-        else:
-            player_input = input("You: ").strip()
-            if player_input.lower() in ("quit", "exit"):
-                break
-            if player_input.lower() == "voice":
-                voice_mode = True
-                print("  Switched to voice input.\n")
-                continue
-            if not player_input:
-                continue
-
-        messages.append({"role": "user", "content": player_input})
-        response = chat(messages)
-        print(f"\nCo-worker: {response}\n")
-        print(f"[State] Location: {state['current_location']} | Discovered: {state['discovered']}\n")
-
-        print("  [speaking...]")
-        try:
-            text_to_speech(response)
-        except Exception as e:
-            print(f"  [TTS error] {e}")
+                sink = AudioSink()
+            except sd.PortAudioError as e:
+                print(f"  [audio output unavailable, using ffplay] {e}")
+            try:
+                mic = Microphone(asyncio.get_running_loop())
+            except sd.PortAudioError as e:
+                print(f"  [mic unavailable, using sox] {e}")
+
+        while True:
+            if voice_mode:
+                cmd = (await ainput("→ Press ENTER to speak (or type 'text'/'quit'): ")).strip().lower()
+                if cmd == "quit":
+                    break
+                if cmd == "text":
+                    voice_mode = False
+                    print("  Switched to keyboard input.\n")
+                    continue
+
+                print("  [recording] speak now...")
+                try:
+                    if mic is not None:
+                        player_input = await transcribe_live(mic)
+                    else:
+                        player_input = await transcribe_recording()
+                except EOFError:
+                    raise
+                except Exception as e:
+                    print(f"  [STT error] {e}\n")
+                    continue
+
+                print(f"  You said: {player_input}")
+            else:
+                player_input = (await ainput("You: ")).strip()
+                if player_input.lower() in ("quit", "exit"):
+                    break
+                if player_input.lower() == "voice":
+                    voice_mode = True
+                    print("  Switched to voice input.\n")
+                    continue
+                if not player_input:
+                    continue
+
+            messages.append({"role": "user", "content": player_input})
+            speaker = Speaker(sink, after=playback)
+            # The prefix waits for the first delta so status lines chat() prints
+            # first ([cache hit], [TOOL] ...) are not spliced into the reply.
+            started = False
+            async for delta in chat(messages):
+                if not started:
+                    print("\nCo-worker: ", end="")
+                    started = True
+                print(delta, end="", flush=True)
+                speaker.feed(delta)
+            print("\n")
+            print(f"[State] Location: {state.current_location} | Discovered: {sorted(state.discovered)}\n")
+
+            playback = speaker.finish()
+            if compaction is None or compaction.done():
+                compaction = asyncio.create_task(compact_history(messages))
+            if state.current_location != prefetched_location:
+                prefetching.cancel()
+                prefetching = asyncio.create_task(prefetch(messages))
+                prefetched_location = state.current_location
+
+        if playback is not None:
+            await playback
+    finally:
+        prefetching.cancel()
+        if compaction is not None:
+            compaction.cancel()
+        warm.cancel()
+        await _http.aclose()
+        if sink is not None:
+            sink.close()
+        if mic is not None:
+            mic.close()
 
     print("Transmission ended.")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())